@@ -2,20 +2,32 @@ from __future__ import annotations
 
 from typing import Any, Dict, List, Optional
 from pathlib import Path
-import shutil
+import asyncio
+import functools
+import os
 import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 
-from fastapi import FastAPI, Request, UploadFile, File, Form, HTTPException
-from fastapi.responses import HTMLResponse, JSONResponse
+import aiofiles
+import orjson
+
+from fastapi import FastAPI, Request, UploadFile, File, Form, HTTPException, BackgroundTasks
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from pydantic import BaseModel, Field
-from fastapi.encoders import jsonable_encoder
 from starlette.responses import JSONResponse
 
 
 # Reuse your existing RAG function (no code duplication)
-from query_rag import answer_query_with_context
+from query_rag import (
+    aanswer_query_with_context,
+    aclient,
+    aretrieve_context,
+    astream_answer_from_contexts,
+    clear_collection_cache,
+)
 
 # Reuse your ingestion pipeline steps
 from pdf_to_tei import convert_pdf_to_tei
@@ -23,13 +35,48 @@ from tei_to_chunks import tei_dir_to_chunks
 from build_rag_index import build_chroma_collection
 
 
-app = FastAPI(title="RAG Web UI")
+class ORJSONResponse(JSONResponse):
+    """JSON response rendered by orjson (C encoder, handles numpy/datetime natively)."""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+
+
+app = FastAPI(title="RAG Web UI", default_response_class=ORJSONResponse)
+
+# Uploads are streamed to ingest_runs/<run>/pdfs in UPLOAD_CHUNK_SIZE pieces and
+# GROBID reads them from there, so memory stays flat however large the batch.
+# With ARCHIVE_UPLOADS=0 each PDF is deleted once it has been converted.
+ARCHIVE_UPLOADS = os.getenv("ARCHIVE_UPLOADS", "1") == "1"
+UPLOAD_CHUNK_SIZE = 1 << 20  # 1 MiB
+
+# Max simultaneous GROBID requests. They run on a dedicated thread pool (created
+# at startup) so long conversions never occupy the default executor that the
+# /api/ask Chroma lookups rely on.
+GROBID_CONCURRENCY = int(os.getenv("GROBID_CONCURRENCY", "10"))
+
+# In-memory ingest job registry: job_id -> progress/result dict (polled by the UI).
+# Finished jobs are dropped JOB_TTL_S seconds after completion.
+JOBS: Dict[str, Dict[str, Any]] = {}
+JOB_TTL_S = int(os.getenv("JOB_TTL_S", "3600"))
 
 BASE_DIR = Path(__file__).resolve().parent
 templates = Jinja2Templates(directory=str(BASE_DIR / "templates"))
 app.mount("/static", StaticFiles(directory=str(BASE_DIR / "static")), name="static")
 
 
+@app.on_event("startup")
+async def _startup():
+    app.state.grobid_executor = ThreadPoolExecutor(max_workers=GROBID_CONCURRENCY, thread_name_prefix="grobid")
+
+
+@app.on_event("shutdown")
+async def _shutdown():
+    app.state.grobid_executor.shutdown(wait=False, cancel_futures=True)
+    clear_collection_cache()
+    await aclient.close()
+
+
 class Message(BaseModel):
     role: str = Field(..., description="chat role, e.g. 'user' or 'assistant'")
     content: str = Field(..., description="message content")
@@ -49,10 +96,10 @@ def index(request: Request):
     return templates.TemplateResponse("index.html", {"request": request})
 
 
-@app.post("/api/ask", response_class=JSONResponse)
-def ask(payload: AskRequest):
+@app.post("/api/ask", response_class=ORJSONResponse)
+async def ask(payload: AskRequest):
     try:
-        answer, contexts = answer_query_with_context(
+        answer, contexts = await aanswer_query_with_context(
             query=payload.message,
             persist_dir=payload.persist_dir,
             collection_name=payload.collection_name,
@@ -66,44 +113,177 @@ def ask(payload: AskRequest):
             else:
                 answer = str(answer)
 
-        # Maintain chat history for the frontend (your backend doesn't manage it)
-        history_in = payload.history or []
-        new_history = history_in + [
-            {"role": "user", "content": payload.message},
-            {"role": "assistant", "content": answer, "contexts": contexts if payload.return_context else []},
-        ]
-
-        response_payload = {
-            "answer": answer,
-            "contexts": contexts if payload.return_context else [],
-            "history": new_history,
-        }
-
-        # Make sure everything is JSON serializable
-        return JSONResponse(content=jsonable_encoder(response_payload))
+        return ORJSONResponse(_answer_payload(payload, answer, contexts))
 
     except Exception as e:
         # Optional: surface a readable error to the UI without leaking internals
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.post("/api/index", response_class=JSONResponse)
-def index_pdfs(
+def _answer_payload(payload: AskRequest, answer: str, contexts: List[Dict]) -> Dict[str, Any]:
+    # Maintain chat history for the frontend (your backend doesn't manage it)
+    contexts_out = contexts if payload.return_context else []
+    history_in = [m.model_dump() for m in payload.history or []]
+    new_history = history_in + [
+        {"role": "user", "content": payload.message},
+        {"role": "assistant", "content": answer, "contexts": contexts_out},
+    ]
+    return {
+        "answer": answer,
+        "contexts": contexts_out,
+        "history": new_history,
+    }
+
+
+def _sse(data: Dict[str, Any], event: Optional[str] = None) -> bytes:
+    prefix = f"event: {event}\n".encode() if event else b""
+    return prefix + b"data: " + orjson.dumps(data) + b"\n\n"
+
+
+@app.post("/api/ask/stream")
+async def ask_stream(payload: AskRequest):
+    """Server-Sent Events version of /api/ask.
+
+    Emits one `data: {"delta": ...}` event per answer token, then a final
+    `event: done` carrying the same answer/contexts/history as /api/ask
+    (or `event: error` with a detail message).
+    """
+
+    async def events():
+        try:
+            contexts = await aretrieve_context(
+                query=payload.message,
+                persist_dir=payload.persist_dir,
+                collection_name=payload.collection_name,
+                k=payload.k,
+            )
+            parts: List[str] = []
+            async for delta in astream_answer_from_contexts(payload.message, contexts):
+                parts.append(delta)
+                yield _sse({"delta": delta})
+            yield _sse(_answer_payload(payload, "".join(parts), contexts), event="done")
+        except Exception as e:
+            yield _sse({"detail": str(e)}, event="error")
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def _save_upload(upload: UploadFile, pdf_path: Path) -> None:
+    async with aiofiles.open(pdf_path, "wb") as out:
+        while chunk := await upload.read(UPLOAD_CHUNK_SIZE):
+            await out.write(chunk)
+
+
+def _unique_name(name: str, used_stems: set) -> str:
+    """
+    Give repeated upload names in one batch a -1, -2, ... suffix. Conversion
+    overlaps the upload loop, so a duplicate would otherwise overwrite a PDF
+    (and its TEI) that a GROBID worker is still using. Stems are compared
+    case-insensitively since the TEI file is named after the stem.
+    """
+    stem, suffix = Path(name).stem, Path(name).suffix
+    candidate, n = name, 0
+    while Path(candidate).stem.lower() in used_stems:
+        n += 1
+        candidate = f"{stem}-{n}{suffix}"
+    used_stems.add(Path(candidate).stem.lower())
+    return candidate
+
+
+async def _grobid_worker(
+    queue: asyncio.Queue,
+    tei_dir: Path,
+    job: Dict[str, Any],
+    grobid_options: Dict[str, int],
+) -> None:
+    """Convert queued PDF paths to TEI until a None sentinel arrives."""
+    while (pdf_path := await queue.get()) is not None:
+        tei_path = tei_dir / (pdf_path.stem + ".tei.xml")
+        try:
+            await asyncio.get_running_loop().run_in_executor(
+                app.state.grobid_executor,
+                functools.partial(convert_pdf_to_tei, pdf_path, tei_path, **grobid_options),
+            )
+            job["pdfs_converted"] += 1
+        except Exception as e:
+            job["errors"].append({"file": pdf_path.name, "error": f"PDF->TEI failed: {e}"})
+        finally:
+            if not ARCHIVE_UPLOADS:
+                pdf_path.unlink(missing_ok=True)
+
+
+def _prune_jobs() -> None:
+    """Forget finished jobs older than JOB_TTL_S so JOBS does not grow without bound."""
+    cutoff = time.time() - JOB_TTL_S
+    expired = [j for j, job in JOBS.items() if "finished_at" in job and job["finished_at"] < cutoff]
+    for job_id in expired:
+        del JOBS[job_id]
+
+
+def _finish(job: Dict[str, Any], **fields: Any) -> None:
+    job.update(fields, finished_at=time.time())
+
+
+async def _ingest(
+    job_id: str,
+    workers: List[asyncio.Task],
+    tei_dir: Path,
+    persist_dir: str,
+    collection_name: str,
+) -> None:
+    """Finish TEI conversion, then chunk and index. Progress is recorded in JOBS[job_id]."""
+    job = JOBS[job_id]
+    job["status"] = "converting"
+    await asyncio.gather(*workers)
+
+    job["status"] = "indexing"
+    try:
+        # An upload batch is small: chunk it in this thread rather than start worker processes
+        chunks = await asyncio.to_thread(tei_dir_to_chunks, str(tei_dir), max_workers=1)
+        if not chunks:
+            _finish(
+                job,
+                status="failed",
+                error="No chunks were extracted from TEI. Check GROBID output and TEI parsing.",
+            )
+            return
+        await asyncio.to_thread(
+            build_chroma_collection, chunks, persist_dir=persist_dir, collection_name=collection_name
+        )
+    except Exception as e:
+        _finish(job, status="failed", error=f"Indexing failed: {e}")
+        return
+
+    _finish(job, status="done", ok=True, chunks_indexed=len(chunks))
+
+
+@app.post("/api/index", response_class=ORJSONResponse)
+async def index_pdfs(
+    background_tasks: BackgroundTasks,
     files: List[UploadFile] = File(..., description="One or more PDF files"),
     persist_dir: str = Form("./rag_db"),
     collection_name: str = Form("papers"),
+    consolidate_header: int = Form(0),
+    consolidate_citations: int = Form(0),
 ):
-    """Upload PDFs and run: PDF -> TEI -> chunks -> Chroma index.
+    """Upload PDFs and queue: PDF -> TEI -> chunks -> Chroma index.
 
-    This is intentionally synchronous for simplicity. For large batches,
-    consider moving the work to a background worker (Celery/RQ) and polling status.
+    Each PDF is streamed to disk and queued for GROBID as soon as it lands
+    (see ARCHIVE_UPLOADS). Chunking and indexing run as a background task;
+    the response is a 202 with a job id to poll at GET /api/index/{job_id}.
     """
     if not files:
-        return JSONResponse({"ok": False, "error": "No files received."}, status_code=400)
+        return ORJSONResponse({"ok": False, "error": "No files received."}, status_code=400)
 
-    # Create an isolated ingestion workspace
-    ts = time.strftime("%Y%m%d-%H%M%S")
-    ingest_root = Path("./ingest_runs") / ts
+    # Create an isolated ingestion workspace; the job id keeps concurrent
+    # submissions (same second) from sharing a TEI directory
+    job_id = uuid.uuid4().hex
+    run_name = f"{time.strftime('%Y%m%d-%H%M%S')}-{job_id[:8]}"
+    ingest_root = Path("./ingest_runs") / run_name
     pdf_dir = ingest_root / "pdfs"
     tei_dir = ingest_root / "tei"
     pdf_dir.mkdir(parents=True, exist_ok=True)
@@ -111,6 +291,29 @@ def index_pdfs(
 
     saved = []
     errors = []
+    used_stems: set = set()
+    job: Dict[str, Any] = {
+        "ok": False,
+        "status": "queued",
+        "ingest_run": run_name,
+        "pdfs_saved": 0,
+        "pdfs_converted": 0,
+        "chunks_indexed": 0,
+        "persist_dir": persist_dir,
+        "collection_name": collection_name,
+        "errors": errors,
+    }
+
+    # Pool of GROBID workers fed as uploads land (None = stop)
+    queue: asyncio.Queue = asyncio.Queue()
+    grobid_options = {
+        "consolidate_header": consolidate_header,
+        "consolidate_citations": consolidate_citations,
+    }
+    workers = [
+        asyncio.create_task(_grobid_worker(queue, tei_dir, job, grobid_options))
+        for _ in range(GROBID_CONCURRENCY)
+    ]
 
     for f in files:
         filename = (f.filename or "").strip()
@@ -118,64 +321,34 @@ def index_pdfs(
             errors.append({"file": filename or "<unknown>", "error": "Not a .pdf file"})
             continue
 
-        safe_name = Path(filename).name  # basic sanitization
+        safe_name = _unique_name(Path(filename).name, used_stems)  # basic sanitization
         pdf_path = pdf_dir / safe_name
         try:
-            with pdf_path.open("wb") as out:
-                shutil.copyfileobj(f.file, out)
-            saved.append(str(pdf_path))
+            await _save_upload(f, pdf_path)
         except Exception as e:
             errors.append({"file": filename, "error": f"Failed to save upload: {e}"})
             continue
 
+        saved.append(safe_name)
+        await queue.put(pdf_path)
+
+    for _ in workers:
+        await queue.put(None)
+
     if not saved:
-        return JSONResponse({"ok": False, "error": "No valid PDFs to process.", "errors": errors}, status_code=400)
+        return ORJSONResponse({"ok": False, "error": "No valid PDFs to process.", "errors": errors}, status_code=400)
 
-    # Convert each PDF to TEI
-    converted = 0
-    for pdf_path_str in saved:
-        pdf_path = Path(pdf_path_str)
-        tei_path = tei_dir / (pdf_path.stem + ".tei.xml")
-        try:
-            convert_pdf_to_tei(pdf_path=pdf_path, tei_path=tei_path)
-            converted += 1
-        except Exception as e:
-            errors.append({"file": pdf_path.name, "error": f"PDF->TEI failed: {e}"})
+    job["pdfs_saved"] = len(saved)
+    _prune_jobs()
+    JOBS[job_id] = job
+    background_tasks.add_task(_ingest, job_id, workers, tei_dir, persist_dir, collection_name)
 
-    # Chunk TEI and build index
-    try:
-        chunks = tei_dir_to_chunks(str(tei_dir))
-        if not chunks:
-            return JSONResponse(
-                {
-                    "ok": False,
-                    "error": "No chunks were extracted from TEI. Check GROBID output and TEI parsing.",
-                    "converted": converted,
-                    "errors": errors,
-                },
-                status_code=500,
-            )
-        build_chroma_collection(chunks, persist_dir=persist_dir, collection_name=collection_name)
-    except Exception as e:
-        return JSONResponse(
-            {
-                "ok": False,
-                "error": f"Indexing failed: {e}",
-                "converted": converted,
-                "errors": errors,
-            },
-            status_code=500,
-        )
+    return ORJSONResponse({"job_id": job_id, "status": job["status"]}, status_code=202)
 
-    return JSONResponse(
-        {
-            "ok": True,
-            "ingest_run": ts,
-            "pdfs_saved": len(saved),
-            "pdfs_converted": converted,
-            "chunks_indexed": len(chunks),
-            "persist_dir": persist_dir,
-            "collection_name": collection_name,
-            "errors": errors,
-        }
-    )
+
+@app.get("/api/index/{job_id}", response_class=ORJSONResponse)
+def index_status(job_id: str):
+    job = JOBS.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job id: {job_id}")
+    return ORJSONResponse({"job_id": job_id, **job})
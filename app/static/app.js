@@ -70,6 +70,7 @@ const clearBtn = document.getElementById("clearBtn");
 const pdfFilesInput = document.getElementById("pdfFiles");
 const indexBtn = document.getElementById("indexBtn");
 const indexStatusEl = document.getElementById("indexStatus");
+const consolidateInput = document.getElementById("consolidate");
 
 const convoListEl = document.getElementById("convoList");
 const newChatBtn = document.getElementById("newChatBtn");
@@ -206,7 +207,7 @@ function bubbleElFromMessage(msg) {
     const itemsHtml = msg.contexts.map((ctx, idx) => {
       const title = ctx?.metadata?.source || ctx?.metadata?.paper_id || `Source ${idx + 1}`;
       const section = ctx?.metadata?.section || "";
-      const chunkId = ctx?.id || ctx?.metadata?.chunk_id || "";
+      const chunkId = ctx?.metadata?.chunk_id || ctx?.id || "";
       const meta = [title, section, chunkId].filter(Boolean).join(" • ");
       const text = ctx?.text || "";
 
@@ -324,7 +325,7 @@ function setActiveConversation(id) {
 /* -----------------------------
    API calls
 ------------------------------ */
-async function askApi(message, priorHistory, settings) {
+async function askApiStream(message, priorHistory, settings, onDelta) {
   setError(null);
 
   const payload = {
@@ -336,18 +337,79 @@ async function askApi(message, priorHistory, settings) {
     return_context: settings.return_context,
   };
 
-  const resp = await fetch("/api/ask", {
+  // POST body rules out EventSource; read the SSE stream from fetch instead
+  const resp = await fetch("/api/ask/stream", {
     method: "POST",
-    headers: { "Content-Type": "application/json" },
+    headers: { "Content-Type": "application/json", Accept: "text/event-stream" },
     body: JSON.stringify(payload),
   });
 
-  if (!resp.ok) {
+  if (!resp.ok || !resp.body) {
     const text = await resp.text();
     throw new Error(`Server error (${resp.status}): ${text}`);
   }
 
-  return resp.json();
+  const reader = resp.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    let sep;
+    while ((sep = buffer.indexOf("\n\n")) !== -1) {
+      const raw = buffer.slice(0, sep);
+      buffer = buffer.slice(sep + 2);
+
+      let event = "message";
+      let data = "";
+      for (const line of raw.split("\n")) {
+        if (line.startsWith("event:")) event = line.slice(6).trim();
+        else if (line.startsWith("data:")) data += line.slice(5).trim();
+      }
+      if (!data) continue;
+
+      const parsed = JSON.parse(data);
+      if (event === "done") return parsed;
+      if (event === "error") throw new Error(`Server error: ${parsed.detail}`);
+      if (parsed.delta) onDelta(parsed.delta);
+    }
+  }
+
+  throw new Error("Stream ended before the answer was complete.");
+}
+
+const INDEX_POLL_MS = 2000;
+
+function showIndexError(data, httpStatus) {
+  const msg = data.error || data.detail || `Indexing failed (HTTP ${httpStatus}).`;
+  if (data.errors && data.errors.length) {
+    setIndexStatus(
+      msg + "\n\nDetails:\n" + data.errors.map((e) => `- ${e.file}: ${e.error}`).join("\n"),
+      "error"
+    );
+  } else {
+    setIndexStatus(msg, "error");
+  }
+}
+
+async function pollIndexJob(jobId) {
+  // Poll the background ingest job until it finishes
+  while (true) {
+    const resp = await fetch(`/api/index/${encodeURIComponent(jobId)}`);
+    const data = await resp.json().catch(() => ({}));
+    if (!resp.ok) return { ok: false, ...data, error: data.detail || `Status check failed (HTTP ${resp.status}).` };
+    if (data.status === "done" || data.status === "failed") return data;
+
+    setIndexStatus(
+      `Indexing in progress (${data.status})...\n` +
+      `PDFs converted to TEI: ${data.pdfs_converted} / ${data.pdfs_saved}`,
+      null
+    );
+    await new Promise((resolve) => setTimeout(resolve, INDEX_POLL_MS));
+  }
 }
 
 async function runIndexing() {
@@ -369,18 +431,22 @@ async function runIndexing() {
     fd.append("persist_dir", settings.persist_dir);
     fd.append("collection_name", settings.collection_name);
 
+    const consolidate = consolidateInput?.checked ? "1" : "0";
+    fd.append("consolidate_header", consolidate);
+    fd.append("consolidate_citations", consolidate);
+
     const resp = await fetch("/api/index", { method: "POST", body: fd });
-    const data = await resp.json().catch(() => ({}));
+    const queued = await resp.json().catch(() => ({}));
 
-    if (!resp.ok || !data.ok) {
-      const msg = data.error || `Indexing failed (HTTP ${resp.status}).`;
-      setIndexStatus(msg, "error");
-      if (data.errors && data.errors.length) {
-        setIndexStatus(
-          msg + "\n\nDetails:\n" + data.errors.map((e) => `- ${e.file}: ${e.error}`).join("\n"),
-          "error"
-        );
-      }
+    if (!resp.ok || !queued.job_id) {
+      showIndexError(queued, resp.status);
+      return;
+    }
+
+    const data = await pollIndexJob(queued.job_id);
+
+    if (!data.ok) {
+      showIndexError(data, 200);
       return;
     }
 
@@ -441,7 +507,13 @@ if (form) {
     }
 
     try {
-      const data = await askApi(message, priorHistory, conv.settings);
+      const contentEl = thinkingEl?.querySelector(".content");
+      let streamed = "";
+      const data = await askApiStream(message, priorHistory, conv.settings, (delta) => {
+        streamed += delta;
+        if (contentEl) contentEl.textContent = streamed;
+        if (chatEl) chatEl.scrollTop = chatEl.scrollHeight;
+      });
 
       // Use server history as canonical
       conv.history = Array.isArray(data.history) ? data.history : (conv.history || []);
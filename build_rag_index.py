@@ -1,46 +1,276 @@
 # build_rag_index.py
+import hashlib
 import os
-from typing import List, Dict
+import re
+import sqlite3
+import sys
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Dict, Iterable, List, Tuple
 
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import NOT_GIVEN, OpenAI, RateLimitError
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_random_exponential
 import chromadb
+import tiktoken
 
-from tei_to_chunks import tei_dir_to_chunks
+from metadata_keys import COMPACT_METADATA_KEYS
+from tei_to_chunks import Chunk, tei_dir_to_chunks
 
 load_dotenv()
 client = OpenAI()  # uses OPENAI_API_KEY from env
 
 EMBEDDING_MODEL = "text-embedding-3-small"  # good & cheap; adjust as needed
 
+# Optional shortened vectors (text-embedding-3 models only), e.g. 512 instead of 1536.
+# Shrinks the Chroma index ~3x; must match query_rag and needs a fresh collection.
+EMBEDDING_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS", "0")) or None
+# Embedding cache key: vectors of different sizes must not be mixed
+EMBEDDING_CACHE_KEY = f"{EMBEDDING_MODEL}@{EMBEDDING_DIMENSIONS}" if EMBEDDING_DIMENSIONS else EMBEDDING_MODEL
 
+# OpenAI caps a single embeddings request at 2048 inputs / 300k tokens
+EMBED_MAX_ITEMS = 2048
+EMBED_MAX_TOKENS = 250_000
+EMBED_CONCURRENCY = 5
+
+# Rows per Chroma write; larger batches amortize per-call segment overhead
+CHROMA_BATCH_SIZE = int(os.getenv("CHROMA_BATCH_SIZE", "1024"))
+
+# Local sha256 -> embedding cache, shared by every persist_dir/collection
+EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH", "./embedding_cache.sqlite3")
+
+
+@lru_cache(maxsize=1)
+def get_encoding() -> tiktoken.Encoding:
+    # Loaded lazily: the BPE file is fetched on first use
+    return tiktoken.encoding_for_model(EMBEDDING_MODEL)
+
+
+@retry(
+    retry=retry_if_exception_type(RateLimitError),
+    wait=wait_random_exponential(min=1, max=60),
+    stop=stop_after_attempt(6),
+    reraise=True,
+)
 def embed_texts(texts: List[str]) -> List[List[float]]:
     """
     Get embeddings from OpenAI.
+    Retries with jittered exponential backoff when rate limited.
     """
     response = client.embeddings.create(
         model=EMBEDDING_MODEL,
         input=texts,
+        dimensions=EMBEDDING_DIMENSIONS or NOT_GIVEN,
     )
     return [item.embedding for item in response.data]
 
 
-def build_chroma_collection(chunks: List[Dict], persist_dir: str = "./rag_db", collection_name: str = "papers"):
+def token_batches(
+    texts: List[str],
+    max_items: int = EMBED_MAX_ITEMS,
+    max_tokens: int = EMBED_MAX_TOKENS,
+) -> List[Tuple[int, int]]:
+    """
+    Greedily pack texts into (start, end) slices that respect both the
+    per-request item limit and the per-request token budget.
+    """
+    batches: List[Tuple[int, int]] = []
+    start = 0
+    tokens = 0
+    for i, n_tokens in enumerate(len(t) for t in get_encoding().encode_batch(texts)):
+        if i > start and (i - start >= max_items or tokens + n_tokens > max_tokens):
+            batches.append((start, i))
+            start, tokens = i, 0
+        tokens += n_tokens
+    if start < len(texts):
+        batches.append((start, len(texts)))
+    return batches
+
+
+def embed_all(texts: List[str]) -> List[List[float]]:
+    """
+    Embed every text, dispatching token-bounded batches concurrently.
+    Output order matches input order.
+    """
+    if not texts:
+        return []
+    embeddings: List[List[float]] = [None] * len(texts)
+
+    def _run(span: Tuple[int, int]) -> None:
+        start, end = span
+        embeddings[start:end] = embed_texts(texts[start:end])
+
+    with ThreadPoolExecutor(max_workers=EMBED_CONCURRENCY) as ex:
+        # list() re-raises the first failure
+        list(ex.map(_run, token_batches(texts)))
+    return embeddings
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+_HASH_ID_RE = re.compile(r"[0-9a-f]{64}")
+
+
+def check_id_scheme(collection, sample_size: int = 100) -> None:
+    """
+    Refuse to write into a collection built before ids became content hashes.
+    Its "paper::sec_i::chunk_j" ids never match a hash, so re-ingesting would
+    store every chunk a second time (duplicate contexts at query time).
+    """
+    sample = collection.get(limit=sample_size, include=[])["ids"]
+    legacy = [i for i in sample if not _HASH_ID_RE.fullmatch(i)]
+    if legacy:
+        raise RuntimeError(
+            f"Collection '{collection.name}' uses structured chunk ids (e.g. {legacy[0]!r}); "
+            "ids are now content hashes. Rebuild it: delete the collection or use a fresh "
+            "persist_dir/collection name, then re-ingest."
+        )
+
+
+def _open_embedding_cache(path: str = EMBED_CACHE_PATH) -> sqlite3.Connection:
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS embeddings ("
+        " model TEXT NOT NULL, hash TEXT NOT NULL, vector BLOB NOT NULL,"
+        " PRIMARY KEY (model, hash))"
+    )
+    return conn
+
+
+def load_cached_embeddings(conn: sqlite3.Connection, hashes: List[str]) -> Dict[str, List[float]]:
+    found: Dict[str, List[float]] = {}
+    step = 500  # stay well under SQLite's bound-parameter limit
+    for i in range(0, len(hashes), step):
+        part = hashes[i : i + step]
+        rows = conn.execute(
+            f"SELECT hash, vector FROM embeddings WHERE model = ? AND hash IN ({','.join('?' * len(part))})",
+            [EMBEDDING_CACHE_KEY, *part],
+        )
+        for h, blob in rows:
+            found[h] = array("f", blob).tolist()
+    return found
+
+
+def store_cached_embeddings(conn: sqlite3.Connection, items: Iterable[Tuple[str, List[float]]]) -> None:
+    with conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO embeddings (model, hash, vector) VALUES (?, ?, ?)",
+            ((EMBEDDING_CACHE_KEY, h, array("f", emb).tobytes()) for h, emb in items),
+        )
+
+
+def compact_metadata(metadata: Dict) -> Dict:
+    """
+    Rename long metadata keys to their short form. paper_id/title values repeat
+    for every chunk of a paper, so they are interned to share one string.
+    """
+    compact = {}
+    for key, value in metadata.items():
+        if key in ("paper_id", "title") and isinstance(value, str):
+            value = sys.intern(value)
+        compact[COMPACT_METADATA_KEYS.get(key, key)] = value
+    return compact
+
+
+# Durability traded for bulk-load speed; the ingest is re-runnable.
+# locking_mode=exclusive is deliberately left out: the pooled connection outlives
+# the load and would lock out readers (e.g. the web app's cached query client).
+BULK_LOAD_PRAGMAS = {
+    "journal_mode": "memory",
+    "synchronous": "off",
+    "temp_store": "memory",
+}
+
+
+@contextmanager
+def bulk_load_pragmas(client_chroma):
+    """
+    Relax Chroma's SQLite settings for the duration of a bulk write, then
+    restore them. Only the Python-backed client (chromadb < 1.0) exposes its
+    connection; on other versions this is a no-op.
+    """
+    try:
+        conn = client_chroma._server._sysdb._conn_pool.connect()
+        previous = {p: conn.execute(f"PRAGMA {p}").fetchone()[0] for p in BULK_LOAD_PRAGMAS}
+        for pragma, value in BULK_LOAD_PRAGMAS.items():
+            conn.execute(f"PRAGMA {pragma} = {value}")
+    except Exception:
+        # Left here, not yielded from: errors in the caller's block must not be
+        # chained to this (expected) lookup failure
+        conn = None
+
+    try:
+        yield
+    finally:
+        if conn is not None:
+            for pragma, value in previous.items():
+                conn.execute(f"PRAGMA {pragma} = {value}")
+
+
+def build_chroma_collection(chunks: List[Chunk], persist_dir: str = "./rag_db", collection_name: str = "papers"):
     client_chroma = chromadb.PersistentClient(path=persist_dir)
     collection = client_chroma.get_or_create_collection(name=collection_name)
 
-    # Insert in manageable batches
-    batch_size = 128
-    for i in range(0, len(chunks), batch_size):
-        batch = chunks[i : i + batch_size]
-        ids = [c["id"] for c in batch]
-        texts = [c["text"] for c in batch]
-        metadatas = [c["metadata"] for c in batch]
-        embeddings = embed_texts(texts)
+    # A fresh collection has nothing to overwrite: plain add skips upsert's
+    # per-id existence probe.
+    is_empty = collection.count() == 0
+    if not is_empty:
+        check_id_scheme(collection)
+    write = collection.add if is_empty else collection.upsert
+    batch_size = min(CHROMA_BATCH_SIZE, client_chroma.get_max_batch_size())
 
-        collection.upsert(ids=ids, documents=texts, metadatas=metadatas, embeddings=embeddings)
+    # Chroma ids are content hashes, so identical text is stored (and embedded) once.
+    # The pipeline's structured id is kept in metadata as "chunk_id".
+    unique: Dict[str, Chunk] = {}
+    for c in chunks:
+        unique.setdefault(content_hash(c.text), c)
 
-    print(f"Stored {len(chunks)} chunks in Chroma collection '{collection_name}' at {persist_dir}")
+    hashes = list(unique)
+    existing = set()
+    if not is_empty:
+        lookup_size = 1000
+        for i in range(0, len(hashes), lookup_size):
+            existing.update(collection.get(ids=hashes[i : i + lookup_size], include=[])["ids"])
+
+    ids = [h for h in hashes if h not in existing]
+    texts = [unique[h].text for h in ids]
+    metadatas = [compact_metadata({**unique[h].metadata, "chunk_id": unique[h].id}) for h in ids]
+
+    # Reuse embeddings computed on earlier runs; only embed what is missing
+    cache = _open_embedding_cache()
+    try:
+        cached = load_cached_embeddings(cache, ids)
+        missing = [i for i, h in enumerate(ids) if h not in cached]
+        fresh = embed_all([texts[i] for i in missing])
+        store_cached_embeddings(cache, ((ids[i], emb) for i, emb in zip(missing, fresh)))
+    finally:
+        cache.close()
+    fresh_by_hash = {ids[i]: emb for i, emb in zip(missing, fresh)}
+    embeddings = [cached.get(h) or fresh_by_hash[h] for h in ids]
+
+    # Insert in manageable batches
+    with bulk_load_pragmas(client_chroma):
+        if not is_empty and hasattr(collection, "bulk_upsert"):
+            collection.bulk_upsert(
+                ids=ids, documents=texts, metadatas=metadatas, embeddings=embeddings, batch_size=batch_size
+            )
+        else:
+            for i in range(0, len(ids), batch_size):
+                write(
+                    ids=ids[i : i + batch_size],
+                    documents=texts[i : i + batch_size],
+                    metadatas=metadatas[i : i + batch_size],
+                    embeddings=embeddings[i : i + batch_size],
+                )
+
+    print(
+        f"Stored {len(ids)} new chunks in Chroma collection '{collection_name}' at {persist_dir} "
+        f"({len(chunks) - len(ids)} duplicates skipped, {len(missing)} embedded)"
+    )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,8 @@
+# metadata_keys.py
+#
+# Short on-disk Chroma metadata keys, shared by the index builder (which
+# writes them) and the query side (which expands them back). Kept in its own
+# dependency-free module so query_rag does not import the ingest pipeline.
+
+COMPACT_METADATA_KEYS = {"paper_id": "p", "title": "t", "section": "s"}
+EXPANDED_METADATA_KEYS = {short: long for long, short in COMPACT_METADATA_KEYS.items()}
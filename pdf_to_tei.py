@@ -3,38 +3,86 @@ import os
 import time
 import logging
 from pathlib import Path
+from typing import BinaryIO
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("pdf_to_tei")
 
 GROBID_URL = "http://grobid:8070/api/processFulltextDocument"  # adjust if needed
 
-
-def convert_pdf_to_tei(pdf_path: Path, tei_path: Path, sleep_between: float = 0.5):
+# Consolidation looks metadata up on CrossRef (rate-limited) and dominates GROBID
+# latency; off by default since chunking for RAG does not need it.
+CONSOLIDATE_HEADER = int(os.getenv("GROBID_CONSOLIDATE_HEADER", "0"))
+CONSOLIDATE_CITATIONS = int(os.getenv("GROBID_CONSOLIDATE_CITATIONS", "0"))
+
+# Shared keep-alive session for all (possibly concurrent) GROBID calls.
+# GROBID answers 503/408 when saturated; retry those with backoff (honours Retry-After).
+# POST is retried explicitly since processing a PDF has no side effects.
+_RETRY = Retry(
+    total=3,
+    backoff_factor=0.5,
+    status_forcelist=[408, 429, 500, 502, 503, 504],
+    allowed_methods=frozenset({"POST"}),
+    raise_on_status=False,
+)
+_SESSION = requests.Session()
+for _prefix in ("http://", "https://"):
+    _SESSION.mount(_prefix, HTTPAdapter(pool_connections=20, pool_maxsize=20, max_retries=_RETRY))
+
+
+def convert_pdf_to_tei(
+    pdf_path: Path,
+    tei_path: Path,
+    sleep_between: float = 0.0,
+    consolidate_header: int = CONSOLIDATE_HEADER,
+    consolidate_citations: int = CONSOLIDATE_CITATIONS,
+):
     """
     Send a single PDF to GROBID and save TEI XML.
     """
     with pdf_path.open("rb") as f:
-        files = {"input": (pdf_path.name, f, "application/pdf")}
-        # params: see GROBID documentation for more options
-        data = {
-            "consolidateHeader": 1,
-            "consolidateHeader": 1,
-            "consolidateCitations": 1,
-        }
-        logger.info(f"Sending {pdf_path} to GROBID...")
-        r = requests.post(GROBID_URL, files=files, data=data, timeout=120)
+        convert_pdf_stream_to_tei(
+            f,
+            pdf_path.name,
+            tei_path,
+            consolidate_header=consolidate_header,
+            consolidate_citations=consolidate_citations,
+        )
+
+    if sleep_between:
+        time.sleep(sleep_between)
+
+
+def convert_pdf_stream_to_tei(
+    pdf_stream: BinaryIO,
+    filename: str,
+    tei_path: Path,
+    consolidate_header: int = CONSOLIDATE_HEADER,
+    consolidate_citations: int = CONSOLIDATE_CITATIONS,
+):
+    """
+    Send PDF bytes from any binary file-like object (e.g. an upload buffer)
+    to GROBID and save TEI XML, without needing the PDF on disk.
+    """
+    files = {"input": (filename, pdf_stream, "application/pdf")}
+    # params: see GROBID documentation for more options
+    data = {
+        "consolidateHeader": consolidate_header,
+        "consolidateCitations": consolidate_citations,
+    }
+    logger.info(f"Sending {filename} to GROBID...")
+    r = _SESSION.post(GROBID_URL, files=files, data=data, timeout=120)
 
     if r.status_code != 200:
-        raise RuntimeError(f"GROBID error ({r.status_code}) for {pdf_path}: {r.text[:500]}")
+        raise RuntimeError(f"GROBID error ({r.status_code}) for {filename}: {r.text[:500]}")
 
     tei_path.write_text(r.text, encoding="utf-8")
     logger.info(f"Saved TEI to {tei_path}")
 
-    time.sleep(sleep_between)
-
 
 def batch_pdf_to_tei(pdf_dir: str, tei_dir: str):
     pdf_dir = Path(pdf_dir)
@@ -4,35 +4,107 @@
 # - retrieve_context: get top-k chunks from Chroma
 # - answer_query: LLM answer using those chunks
 # - answer_query_with_context: returns both answer AND the chunks (for proof-reading)
+#
+# retrieve_context and answer_query_with_context have async twins
+# (aretrieve_context, aanswer_query_with_context) built on AsyncOpenAI for the web app;
+# astream_answer_from_contexts streams the answer token by token.
 
-from typing import List, Dict, Tuple
+import asyncio
+import io
+import os
+from functools import lru_cache
+from typing import AsyncIterator, List, Dict, Tuple
 
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import NOT_GIVEN, AsyncOpenAI, DefaultAsyncHttpxClient, OpenAI
 import chromadb
+import diskcache
+import httpx
+
+from metadata_keys import EXPANDED_METADATA_KEYS
 
 load_dotenv()
 client = OpenAI()
 
+# One keep-alive HTTP pool shared by all concurrent async requests
+aclient = AsyncOpenAI(
+    http_client=DefaultAsyncHttpxClient(
+        limits=httpx.Limits(max_connections=20, max_keepalive_connections=20),
+    )
+)
+
 RAG_EMBED_MODEL = "text-embedding-3-small"
+# Must match the EMBEDDING_DIMENSIONS the index was built with (see build_rag_index.py)
+RAG_EMBED_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS", "0")) or None
 CHAT_MODEL = "gpt-4.1-mini"  # adjust if you prefer another model
 
+# Query embeddings keyed by (model, dimensions, normalized query); persisted so restarts keep hits
+query_embedding_cache = diskcache.Cache(
+    os.getenv("QUERY_EMBED_CACHE_DIR", "./query_embed_cache"),
+    size_limit=2**26,  # 64 MiB
+)
+
 
 # -----------------------------
 # Embedding + retrieval
 # -----------------------------
 
+def _normalize_query(query: str) -> str:
+    # Case and whitespace differences should not miss the cache
+    return " ".join(query.lower().split())
+
+
 def embed_query(query: str) -> List[float]:
+    query = _normalize_query(query)
+    key = (RAG_EMBED_MODEL, RAG_EMBED_DIMENSIONS, query)
+    cached = query_embedding_cache.get(key)
+    if cached is not None:
+        return cached
+
     response = client.embeddings.create(
         model=RAG_EMBED_MODEL,
         input=[query],
+        dimensions=RAG_EMBED_DIMENSIONS or NOT_GIVEN,
+    )
+    embedding = response.data[0].embedding
+    query_embedding_cache.set(key, embedding)
+    return embedding
+
+
+async def aembed_query(query: str) -> List[float]:
+    query = _normalize_query(query)
+    key = (RAG_EMBED_MODEL, RAG_EMBED_DIMENSIONS, query)
+    # diskcache is blocking SQLite I/O (writes may fsync): keep it off the event loop
+    cached = await asyncio.to_thread(query_embedding_cache.get, key)
+    if cached is not None:
+        return cached
+
+    response = await aclient.embeddings.create(
+        model=RAG_EMBED_MODEL,
+        input=[query],
+        dimensions=RAG_EMBED_DIMENSIONS or NOT_GIVEN,
     )
-    return response.data[0].embedding
+    embedding = response.data[0].embedding
+    await asyncio.to_thread(query_embedding_cache.set, key, embedding)
+    return embedding
+
+
+# Client and collection handles are cached so each query skips reopening
+# the SQLite store and reloading index metadata.
+
+@lru_cache(maxsize=8)
+def _get_client(persist_dir: str):
+    return chromadb.PersistentClient(path=persist_dir)
 
 
+@lru_cache(maxsize=32)
 def get_collection(persist_dir: str = "./rag_db", collection_name: str = "papers"):
-    client_chroma = chromadb.PersistentClient(path=persist_dir)
-    return client_chroma.get_collection(name=collection_name)
+    return _get_client(persist_dir).get_collection(name=collection_name)
+
+
+def clear_collection_cache() -> None:
+    get_collection.cache_clear()
+    _get_client.cache_clear()
 
 
 def retrieve_context(
@@ -51,32 +123,91 @@ def retrieve_context(
             "metadata": { ... }  # paper_id, title, section, etc.
         }
     """
-    collection = get_collection(persist_dir, collection_name)
     query_embedding = embed_query(query)
+    return _query_collection(persist_dir, collection_name, query_embedding, k)
 
+
+async def aretrieve_context(
+    query: str,
+    persist_dir: str = "./rag_db",
+    collection_name: str = "papers",
+    k: int = 5,
+) -> List[Dict]:
+    """
+    Async version of retrieve_context. The Chroma lookup is blocking and
+    runs in a worker thread.
+    """
+    query_embedding = await aembed_query(query)
+    return await asyncio.to_thread(_query_collection, persist_dir, collection_name, query_embedding, k)
+
+
+def _expand_metadata(metadata: Dict) -> Dict:
+    # Indexes store short keys (see build_rag_index.compact_metadata); older ones may not
+    return {EXPANDED_METADATA_KEYS.get(k, k): v for k, v in (metadata or {}).items()}
+
+
+def _query_collection(
+    persist_dir: str,
+    collection_name: str,
+    query_embedding: List[float],
+    k: int,
+) -> List[Dict]:
+    collection = get_collection(persist_dir, collection_name)
+    # Only fetch what we return; embeddings/distances are never used
     results = collection.query(
         query_embeddings=[query_embedding],
         n_results=k,
+        include=["documents", "metadatas"],
     )
 
-    contexts: List[Dict] = []
-    for doc_id, doc_text, metadata in zip(
-        results["ids"][0], results["documents"][0], results["metadatas"][0]
-    ):
-        contexts.append(
-            {
-                "id": doc_id,
-                "text": doc_text,
-                "metadata": metadata,
-            }
-        )
-    return contexts
+    ids, docs, metas = results["ids"][0], results["documents"][0], results["metadatas"][0]
+    return [
+        {"id": doc_id, "text": doc_text, "metadata": _expand_metadata(metadata)}
+        for doc_id, doc_text, metadata in zip(ids, docs, metas)
+    ]
 
 
 # -----------------------------
 # Prompt building
 # -----------------------------
 
+SYSTEM_PROMPT = (
+    "You are a rigorous scientific assistant.\n"
+    "You must answer ONLY using the provided context chunks from scientific articles.\n"
+    "If the answer is not contained in the context, say you do not know.\n\n"
+    "When you make a factual statement that is supported by a chunk, "
+    "cite it inline using [S1], [S2], etc., corresponding to the chunk labels.\n"
+    "Do not fabricate new sources, DO NOT invent citation labels, and do not mention any documents "
+    "that are not labeled [S1], [S2], etc.\n"
+    "You do NOT need to list a separate 'Sources' section; the caller will handle that.\n"
+)
+
+CONTEXT_BLOCK_TEMPLATE = "[S{i}] {paper_id} – {title}{section_info}\nChunk text:\n{text}\n"
+
+USER_PROMPT_TEMPLATE = (
+    "User question:\n"
+    "{query}\n\n"
+    "Context from scientific articles:\n"
+    "{context}\n\n"
+    "Answer the question as precisely and concisely as possible. "
+    "If you are unsure or the information is incomplete, clearly say so."
+)
+
+
+def _format_context_block(i: int, ctx: Dict) -> str:
+    m = ctx["metadata"]
+    section = m.get("section", "")
+    return CONTEXT_BLOCK_TEMPLATE.format_map(
+        {
+            "i": i,
+            "paper_id": m.get("paper_id", "unknown"),
+            "title": m.get("title", "").strip(),
+            "section_info": f" (section: {section})" if section else "",
+            "text": ctx["text"],
+        }
+    )
+
+
 def build_prompt(query: str, contexts: List[Dict]) -> List[Dict]:
     """
     Construct the chat messages for the LLM.
@@ -87,47 +218,12 @@ def build_prompt(query: str, contexts: List[Dict]) -> List[Dict]:
     Note: we do NOT ask the LLM to generate a "Sources" section.
     That part can be done programmatically outside the model.
     """
+    context = "\n".join([_format_context_block(i, ctx) for i, ctx in enumerate(contexts, start=1)])
 
-    context_blocks = []
-    for i, ctx in enumerate(contexts, start=1):
-        m = ctx["metadata"]
-        label = f"[S{i}]"
-        title = m.get("title", "").strip()
-        section = m.get("section", "")
-        section_info = f" (section: {section})" if section else ""
-        header = f"{label} {m.get('paper_id', 'unknown')} – {title}{section_info}"
-
-        context_blocks.append(
-            f"{header}\n"
-            f"Chunk text:\n{ctx['text']}\n"
-        )
-
-    system_prompt = (
-        "You are a rigorous scientific assistant.\n"
-        "You must answer ONLY using the provided context chunks from scientific articles.\n"
-        "If the answer is not contained in the context, say you do not know.\n\n"
-        "When you make a factual statement that is supported by a chunk, "
-        "cite it inline using [S1], [S2], etc., corresponding to the chunk labels.\n"
-        "Do not fabricate new sources, DO NOT invent citation labels, and do not mention any documents "
-        "that are not labeled [S1], [S2], etc.\n"
-        "You do NOT need to list a separate 'Sources' section; the caller will handle that.\n"
-    )
-
-    user_prompt = (
-        "User question:\n"
-        f"{query}\n\n"
-        "Context from scientific articles:\n"
-        + "\n".join(context_blocks)
-        + "\n\n"
-        "Answer the question as precisely and concisely as possible. "
-        "If you are unsure or the information is incomplete, clearly say so."
-    )
-
-    messages = [
-        {"role": "system", "content": system_prompt},
-        {"role": "user", "content": user_prompt},
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": USER_PROMPT_TEMPLATE.format(query=query, context=context)},
     ]
-    return messages
 
 
 # -----------------------------
@@ -153,6 +249,43 @@ def llm_answer_from_contexts(query: str, contexts: List[Dict]) -> str:
     return completion.choices[0].message.content
 
 
+async def allm_answer_from_contexts(query: str, contexts: List[Dict]) -> str:
+    """
+    Async version of llm_answer_from_contexts.
+    """
+    if not contexts:
+        return "No relevant documents found in the RAG index."
+
+    messages = build_prompt(query, contexts)
+    completion = await aclient.chat.completions.create(
+        model=CHAT_MODEL,
+        messages=messages,
+        temperature=0.3,
+    )
+    return completion.choices[0].message.content
+
+
+async def astream_answer_from_contexts(query: str, contexts: List[Dict]) -> AsyncIterator[str]:
+    """
+    Streaming version of allm_answer_from_contexts: yields answer text
+    deltas as the model produces them.
+    """
+    if not contexts:
+        yield "No relevant documents found in the RAG index."
+        return
+
+    messages = build_prompt(query, contexts)
+    stream = await aclient.chat.completions.create(
+        model=CHAT_MODEL,
+        messages=messages,
+        temperature=0.3,
+        stream=True,
+    )
+    async for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+
 def answer_query(
     query: str,
     persist_dir: str = "./rag_db",
@@ -197,6 +330,26 @@ def answer_query_with_context(
     return answer, contexts
 
 
+async def aanswer_query_with_context(
+    query: str,
+    persist_dir: str = "./rag_db",
+    collection_name: str = "papers",
+    k: int = 5,
+) -> Tuple[str, List[Dict]]:
+    """
+    Async version of answer_query_with_context, used by the web app so
+    concurrent requests overlap their OpenAI round-trips.
+    """
+    contexts = await aretrieve_context(
+        query=query,
+        persist_dir=persist_dir,
+        collection_name=collection_name,
+        k=k,
+    )
+    answer = await allm_answer_from_contexts(query, contexts)
+    return answer, contexts
+
+
 # -----------------------------
 # Optional: simple CLI for debugging
 # -----------------------------
@@ -205,16 +358,18 @@ def pretty_print_contexts(contexts: List[Dict]) -> None:
     """
     Utility function to print retrieved chunks with labels matching [S1], [S2], ...
     """
+    out = io.StringIO()
     for i, ctx in enumerate(contexts, start=1):
         m = ctx["metadata"]
-        print("=" * 80)
-        print(f"[S{i}] {m.get('paper_id', 'unknown')} – {m.get('title', '').strip()}")
+        out.write("=" * 80)
+        out.write(f"\n[S{i}] {m.get('paper_id', 'unknown')} – {m.get('title', '').strip()}\n")
         if "section" in m:
-            print(f"Section: {m['section']}")
-        print(f"Chunk ID: {ctx['id']}")
-        print("\nChunk text (truncated):\n")
-        print(ctx["text"][:800], "...")
-        print()
+            out.write(f"Section: {m['section']}\n")
+        out.write(f"Chunk ID: {m.get('chunk_id', ctx['id'])}\n")
+        out.write("\nChunk text (truncated):\n\n")
+        out.write(ctx["text"][:800])
+        out.write(" ...\n\n")
+    print(out.getvalue(), end="")
 
 
 if __name__ == "__main__":
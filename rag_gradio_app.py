@@ -4,6 +4,7 @@
 # - Uses messages-style history: [{"role": "user", "content": ...}, ...]
 # - No use of type="messages" (your Gradio version doesn't support it).
 
+import io
 from typing import List, Dict
 import gradio as gr
 
@@ -17,7 +18,7 @@ def format_contexts(contexts: List[Dict]) -> str:
     if not contexts:
         return "No context chunks were retrieved."
 
-    lines = []
+    out = io.StringIO()
     for i, ctx in enumerate(contexts, start=1):
         m = ctx.get("metadata", {}) or {}
         paper_id = m.get("paper_id", "unknown")
@@ -25,16 +26,17 @@ def format_contexts(contexts: List[Dict]) -> str:
         section = m.get("section")
         section_str = f" – section: {section}" if section else ""
 
-        header = f"[S{i}] {paper_id} – {title}{section_str}"
         chunk_text = ctx.get("text", "") or ""
 
         # Truncate chunk text so UI does not explode
         if len(chunk_text) > 800:
             chunk_text = chunk_text[:800] + "..."
 
-        lines.append(f"**{header}**\n\n{chunk_text}\n")
+        if i > 1:
+            out.write("\n---\n\n")
+        out.write(f"**[S{i}] {paper_id} – {title}{section_str}**\n\n{chunk_text}\n")
 
-    return "\n---\n\n".join(lines)
+    return out.getvalue()
 
 
 def rag_chat(
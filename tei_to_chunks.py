@@ -7,16 +7,108 @@
 #   - Chunks text within each section using a word window.
 #   - Returns chunks with rich metadata for RAG.
 #
-# Main entry point: tei_dir_to_chunks(tei_dir: str) -> List[Dict]
-
+# Main entry point: tei_dir_to_chunks(tei_dir: str) -> List[Chunk]
+# (iter_tei_dir_chunks streams the same chunks lazily; tei_dir_to_chunks_jsonl
+# writes them to a JSON Lines file)
+
+import multiprocessing
+import os
+import re
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import islice
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import Dict, Iterator, List, NamedTuple, Optional
 
+import orjson
 from lxml import etree
 
 # TEI namespace used by GROBID
 TEI_NS = {"tei": "http://www.tei-c.org/ns/1.0"}
 
+# Clark-notation tags for the streaming parser
+_T = "{%s}" % TEI_NS["tei"]
+_TAG_HEADER = _T + "teiHeader"
+_TAG_TITLE_STMT = _T + "titleStmt"
+_TAG_TITLE = _T + "title"
+_TAG_PROFILE_DESC = _T + "profileDesc"
+_TAG_ABSTRACT = _T + "abstract"
+_TAG_TEXT = _T + "text"
+_TAG_BODY = _T + "body"
+_TAG_DIV = _T + "div"
+_TAG_HEAD = _T + "head"
+_TAG_P = _T + "p"
+_STREAM_TAGS = (
+    _TAG_HEADER, _TAG_TITLE, _TAG_PROFILE_DESC, _TAG_ABSTRACT,
+    _TAG_BODY, _TAG_DIV, _TAG_HEAD, _TAG_P,
+)
+
+# Parser options for iterparse: skip xml:id indexing and entity expansion we
+# never need, and drop comments/PIs at parse time. remove_blank_text is left
+# off on purpose: libxml2 would also drop the blank text between inline
+# elements (e.g. "<ref>A</ref> <ref>B</ref>"), gluing words together.
+_PARSE_OPTIONS = dict(
+    collect_ids=False,
+    resolve_entities=False,
+    remove_comments=True,
+    remove_pis=True,
+)
+
+# Common scientific section aliases, highest priority first
+_SECTION_ALIASES = [
+    ("introduction", ["introduction", "background"]),
+    ("methods", ["method", "materials", "patients and methods"]),
+    ("results", ["result", "findings"]),
+    ("discussion", ["discussion", "interpretation"]),
+    ("conclusion", ["conclusion", "concluding", "summary"]),
+    ("abstract", ["abstract"]),
+]
+# keyword -> (priority, canonical label)
+_SECTION_MAP = {
+    k: (rank, label) for rank, (label, keywords) in enumerate(_SECTION_ALIASES) for k in keywords
+}
+_SECTION_RE = re.compile("|".join(map(re.escape, _SECTION_MAP)))
+
+# Worker processes are never fork()ed from the caller, which may be a
+# multi-threaded server (executor threads, HTTP pools, Chroma's runtime)
+_MP_CONTEXT = multiprocessing.get_context(
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+)
+
+
+# -------------------------------------------------------------------
+# Chunk record
+# -------------------------------------------------------------------
+
+class Chunk(NamedTuple):
+    """
+    One RAG chunk. A flat tuple instead of the nested id/text/metadata
+    dicts: a fraction of the memory per chunk and cheap to pickle back
+    from worker processes. Use to_dict() where the dict form is needed.
+    """
+    id: str
+    text: str
+    paper_id: str
+    title: str
+    section: str
+    section_index: int
+    chunk_index: int
+
+    @property
+    def metadata(self) -> Dict:
+        return {
+            "paper_id": self.paper_id,
+            "title": self.title,
+            "section": self.section,
+            "section_index": self.section_index,
+            "chunk_index": self.chunk_index,
+        }
+
+    def to_dict(self) -> Dict:
+        return {"id": self.id, "text": self.text, "metadata": self.metadata}
+
 
 # -------------------------------------------------------------------
 # Helpers
@@ -24,47 +116,157 @@ TEI_NS = {"tei": "http://www.tei-c.org/ns/1.0"}
 
 def _elem_to_text(elem) -> str:
     """
-    Safely convert an XML element to plain text by joining all text nodes.
+    Safely convert an XML element to plain text with whitespace collapsed.
+    Text nodes are concatenated by libxml2 itself (no per-fragment strings).
     Returns an empty string if elem is None.
     """
     if elem is None:
         return ""
-    text = " ".join(elem.itertext()).strip()
-    return text
+    text = etree.tostring(elem, method="text", encoding="unicode", with_tail=False)
+    return " ".join(text.split())
 
 
+@lru_cache(maxsize=1024)
 def _normalize_section_name(raw: Optional[str]) -> str:
     """
     Normalize section names to a small set of canonical labels where possible.
     This improves interpretability of metadata (e.g. "methods" vs "Methods").
+    Memoized: the same headings recur in nearly every paper. Results are
+    interned so every chunk of a section shares one string object.
     """
     if not raw:
         return "unlabeled"
 
     name = raw.strip().lower()
 
-    # Common scientific section aliases
-    if any(k in name for k in ["introduction", "background"]):
-        return "introduction"
-    if any(k in name for k in ["method", "materials", "patients and methods"]):
-        return "methods"
-    if any(k in name for k in ["result", "findings"]):
-        return "results"
-    if any(k in name for k in ["discussion", "interpretation"]):
-        return "discussion"
-    if any(k in name for k in ["conclusion", "concluding", "summary"]):
-        return "conclusion"
-    if "abstract" in name:
-        return "abstract"
+    # One regex pass; when several aliases occur, the highest-priority label wins
+    best = min((_SECTION_MAP[m.group()] for m in _SECTION_RE.finditer(name)), default=None)
+    if best is not None:
+        return sys.intern(best[1])
 
     # Fall back to cleaned raw
-    return name
+    return sys.intern(name)
 
 
 # -------------------------------------------------------------------
 # Core TEI extraction
 # -------------------------------------------------------------------
 
+def _release(elem) -> None:
+    """
+    Free a fully processed subtree and any earlier siblings still attached
+    to the parent, so memory stays bounded by the current section.
+    """
+    elem.clear()
+    while elem.getprevious() is not None:
+        del elem.getparent()[0]
+
+
+def _stream_extract(tei_path: Path) -> Dict:
+    """
+    Single streaming pass over a TEI file. Mirrors the paths:
+      title:    //titleStmt/title (first)
+      abstract: //profileDesc//abstract//p
+      sections: //text/body//div, each with ./head and .//p
+      fallback: //text/body//p when the body has no <div>
+    Sections and paragraphs are kept in document (start-tag) order: a
+    paragraph's slot is reserved when it opens and filled when it closes,
+    so a <p> nested in another (e.g. via <note>) follows its container.
+    A paragraph inside nested divs counts for every enclosing div, like
+    .//p does.
+
+    GROBID writes <teiHeader> before <text>, so once the header and the
+    body are both closed nothing else is needed and the rest of the file
+    (<back>, i.e. the bibliography) is not read. Without a header the
+    whole file is scanned, as the descendant paths would.
+
+    Each body paragraph is released as soon as its text is taken (unless it
+    sits inside another <p>, whose text is still to be read), so memory is
+    bounded by a single paragraph rather than a section or the file.
+    """
+    title = ""
+    have_title = False
+    abstract_paras: List[str] = []
+    body_paras: List[str] = []
+    divs: List[Dict] = []
+    open_divs: List = []  # [(div element, record)] innermost last
+    open_ps: List = []  # per open <p>: [(target list, reserved index)]
+    profile_depth = abstract_depth = body_depth = 0
+    header_done = False
+
+    for event, elem in etree.iterparse(
+        str(tei_path), events=("start", "end"), tag=_STREAM_TAGS, **_PARSE_OPTIONS
+    ):
+        tag = elem.tag
+
+        if event == "start":
+            if tag == _TAG_P:
+                if abstract_depth:
+                    targets = [abstract_paras]
+                elif body_depth:
+                    targets = [body_paras] + [record["paragraphs"] for _, record in open_divs]
+                else:
+                    targets = []
+                open_ps.append([(lst, len(lst)) for lst in targets])
+                for lst in targets:
+                    lst.append(None)
+            elif tag == _TAG_DIV and body_depth:
+                record = {"type": elem.get("type"), "head": None, "paragraphs": []}
+                divs.append(record)
+                open_divs.append((elem, record))
+            elif tag == _TAG_BODY and elem.getparent() is not None and elem.getparent().tag == _TAG_TEXT:
+                body_depth += 1
+            elif tag == _TAG_PROFILE_DESC:
+                profile_depth += 1
+            elif tag == _TAG_ABSTRACT and profile_depth:
+                abstract_depth += 1
+            continue
+
+        if tag == _TAG_P:
+            slots = open_ps.pop()
+            if slots:
+                text = _elem_to_text(elem)
+                for lst, i in slots:
+                    lst[i] = text
+            if body_depth and not abstract_depth and not open_ps:
+                _release(elem)
+        elif tag == _TAG_HEAD:
+            if open_divs and elem.getparent() is open_divs[-1][0] and open_divs[-1][1]["head"] is None:
+                open_divs[-1][1]["head"] = _elem_to_text(elem)
+        elif tag == _TAG_DIV:
+            if open_divs and elem is open_divs[-1][0]:
+                open_divs.pop()
+                if not open_divs:
+                    _release(elem)
+        elif tag == _TAG_TITLE:
+            if not have_title and elem.getparent().tag == _TAG_TITLE_STMT:
+                have_title = True
+                title = _elem_to_text(elem)
+        elif tag == _TAG_ABSTRACT:
+            if abstract_depth:
+                abstract_depth -= 1
+        elif tag == _TAG_PROFILE_DESC:
+            profile_depth -= 1
+        elif tag == _TAG_BODY:
+            if body_depth and elem.getparent().tag == _TAG_TEXT:
+                body_depth -= 1
+                if header_done and not body_depth:
+                    break
+        elif tag == _TAG_HEADER:
+            _release(elem)
+            header_done = True
+
+    # Drop empty paragraphs (reserved slots whose text was blank)
+    for div in divs:
+        div["paragraphs"] = [t for t in div["paragraphs"] if t]
+    return {
+        "title": title,
+        "abstract_paras": [t for t in abstract_paras if t],
+        "divs": divs,
+        "body_paras": [t for t in body_paras if t],
+    }
+
+
 def extract_paper_structure_from_tei(tei_path: Path) -> Dict:
     """
     Parse a TEI file and extract:
@@ -73,83 +275,32 @@ def extract_paper_structure_from_tei(tei_path: Path) -> Dict:
       - abstract (as a single string)
       - sections: list of {section_name, paragraphs: [str, ...]}
     """
-    tree = etree.parse(str(tei_path))
-    root = tree.getroot()
+    raw = _stream_extract(tei_path)
 
     # ---------- Title ----------
-    title_elems = root.xpath("//tei:titleStmt/tei:title", namespaces=TEI_NS)
-    if title_elems:
-        title_text = _elem_to_text(title_elems[0])
-        title = title_text if title_text else tei_path.stem
-    else:
-        title = tei_path.stem
+    title = raw["title"] or tei_path.stem
 
     # ---------- Abstract ----------
-    abstract_elems = root.xpath(
-        "//tei:profileDesc//tei:abstract//tei:p",
-        namespaces=TEI_NS,
-    )
-    if abstract_elems:
-        abstract_paras = [_elem_to_text(p) for p in abstract_elems]
-        abstract = "\n".join(p for p in abstract_paras if p)
-    else:
-        abstract = ""
+    abstract = "\n".join(raw["abstract_paras"])
 
     # ---------- Body sections ----------
     # GROBID typically structures body as <text><body><div type="...">...</div></body></text>
-    div_sections = root.xpath(
-        "//tei:text/tei:body//tei:div",
-        namespaces=TEI_NS,
-    )
-
-    sections: List[Dict] = []
-
-    if div_sections:
-        # We have structured <div> sections
-        for div in div_sections:
-            # Candidate names:
-            #   - @type attribute
-            #   - <head> text
-            sec_type = div.get("type")
-            head_elems = div.xpath("./tei:head", namespaces=TEI_NS)
-            head_text = _elem_to_text(head_elems[0]) if head_elems else ""
-
-            raw_name = sec_type or head_text
-            section_name = _normalize_section_name(raw_name)
-
-            para_elems = div.xpath(".//tei:p", namespaces=TEI_NS)
-            paragraphs: List[str] = []
-            for p in para_elems:
-                text = _elem_to_text(p)
-                if text:
-                    paragraphs.append(text)
-
-            if paragraphs:
-                sections.append(
-                    {
-                        "section_name": section_name,
-                        "paragraphs": paragraphs,
-                    }
-                )
-    else:
+    if raw["divs"]:
+        # We have structured <div> sections, named by @type or else <head> text;
+        # only non-empty paragraphs were collected, so empty divs drop out here
+        sections = [
+            {
+                "section_name": _normalize_section_name(div["type"] or div["head"] or ""),
+                "paragraphs": div["paragraphs"],
+            }
+            for div in raw["divs"]
+            if div["paragraphs"]
+        ]
+    elif raw["body_paras"]:
         # No <div> sections: fall back to all body paragraphs as a single "body" section
-        body_paras = root.xpath(
-            "//tei:text/tei:body//tei:p",
-            namespaces=TEI_NS,
-        )
-        paragraphs: List[str] = []
-        for p in body_paras:
-            text = _elem_to_text(p)
-            if text:
-                paragraphs.append(text)
-
-        if paragraphs:
-            sections.append(
-                {
-                    "section_name": "body",
-                    "paragraphs": paragraphs,
-                }
-            )
+        sections = [{"section_name": "body", "paragraphs": raw["body_paras"]}]
+    else:
+        sections = []
 
     return {
         "paper_id": tei_path.stem,
@@ -163,6 +314,20 @@ def extract_paper_structure_from_tei(tei_path: Path) -> Dict:
 # Chunking
 # -------------------------------------------------------------------
 
+def _chunk_starts(n: int, max_words: int, overlap_words: int) -> range:
+    """
+    Start offsets of the word windows for an n-word section. Closed form,
+    O(1) to build: no per-word (or per-chunk) work happens here.
+    """
+    if not n:
+        return range(0)
+    step = max_words - overlap_words
+    last = (n - max_words) // step + 1 if n >= max_words else 0
+    # With overlap_words=0 and n a multiple of max_words, the last start
+    # lands exactly on n; capping the stop at n drops that empty window
+    return range(0, min(last * step + 1, n), step)
+
+
 def chunk_paragraphs(
     paragraphs: List[str],
     max_words: int = 280,
@@ -172,65 +337,56 @@ def chunk_paragraphs(
     Word-based chunking across paragraphs.
     - max_words: approximate max words per chunk
     - overlap_words: words carried over between chunks for context
-    """
-    chunks: List[str] = []
-    current_words: List[str] = []
+      (0 <= overlap_words < max_words, else ValueError)
 
-    def flush():
-        if current_words:
-            chunks.append(" ".join(current_words).strip())
-
-    for para in paragraphs:
-        words = para.split()
-        for w in words:
-            current_words.append(w)
-            if len(current_words) >= max_words:
-                flush()
-                # overlap for context
-                current_words[:] = current_words[-overlap_words:]
+    Chunk boundaries are computed arithmetically: chunks start every
+    max_words - overlap_words words, and the last one starts at the first
+    window that runs past the end (which may hold only overlap words).
+    """
+    if not 0 <= overlap_words < max_words:
+        raise ValueError(
+            f"overlap_words must be in [0, max_words); got overlap_words={overlap_words}, max_words={max_words}"
+        )
 
-    flush()
-    return chunks
+    # One join + split for the whole section instead of one split per paragraph
+    words = " ".join(paragraphs).split()
+    starts = _chunk_starts(len(words), max_words, overlap_words)
+    return [" ".join(words[s : s + max_words]) for s in starts]
 
 
-def build_chunks_from_paper(paper: Dict) -> List[Dict]:
+def build_chunks_from_paper(paper: Dict) -> List[Chunk]:
     """
-    Convert a parsed paper structure into chunk dicts suitable for RAG.
+    Convert a parsed paper structure into Chunk records suitable for RAG.
 
-    Each chunk dict contains:
+    Each Chunk has:
       - id
       - text
-      - metadata: {
-            paper_id,
-            title,
-            section,
-            section_index,
-            chunk_index_within_section
-        }
+      - paper_id, title, section, section_index,
+        chunk_index (within the section)
     """
-    paper_id = paper["paper_id"]
-    title = paper["title"]
+    # Repeated on every chunk of the paper: share one interned object
+    paper_id = sys.intern(paper["paper_id"])
+    title = sys.intern(paper["title"])
 
-    all_chunks: List[Dict] = []
+    all_chunks: List[Chunk] = []
 
     # 1. Abstract as its own pseudo-section (if present)
     section_index = 0
     if paper["abstract"]:
         abstract_paragraphs = [paper["abstract"]]
         abstract_chunks = chunk_paragraphs(abstract_paragraphs)
+        id_prefix = f"{paper_id}::sec_{section_index}::chunk_"
         for j, ch_text in enumerate(abstract_chunks):
             all_chunks.append(
-                {
-                    "id": f"{paper_id}::sec_{section_index}::chunk_{j}",
-                    "text": ch_text,
-                    "metadata": {
-                        "paper_id": paper_id,
-                        "title": title,
-                        "section": "abstract",
-                        "section_index": section_index,
-                        "chunk_index": j,
-                    },
-                }
+                Chunk(
+                    id=id_prefix + str(j),
+                    text=ch_text,
+                    paper_id=paper_id,
+                    title=title,
+                    section="abstract",
+                    section_index=section_index,
+                    chunk_index=j,
+                )
             )
         section_index += 1
 
@@ -243,20 +399,19 @@ def build_chunks_from_paper(paper: Dict) -> List[Dict]:
             continue
 
         sec_chunks = chunk_paragraphs(paragraphs)
+        id_prefix = f"{paper_id}::sec_{sec_idx}::chunk_"
 
         for j, ch_text in enumerate(sec_chunks):
             all_chunks.append(
-                {
-                    "id": f"{paper_id}::sec_{sec_idx}::chunk_{j}",
-                    "text": ch_text,
-                    "metadata": {
-                        "paper_id": paper_id,
-                        "title": title,
-                        "section": section_name,
-                        "section_index": sec_idx,
-                        "chunk_index": j,
-                    },
-                }
+                Chunk(
+                    id=id_prefix + str(j),
+                    text=ch_text,
+                    paper_id=paper_id,
+                    title=title,
+                    section=section_name,
+                    section_index=sec_idx,
+                    chunk_index=j,
+                )
             )
 
     return all_chunks
@@ -266,48 +421,95 @@ def build_chunks_from_paper(paper: Dict) -> List[Dict]:
 # Directory-level function
 # -------------------------------------------------------------------
 
-def tei_dir_to_chunks(tei_dir: str) -> List[Dict]:
+def _process_one_tei(path_str: str) -> List[Chunk]:
     """
-    Read all TEI files in a directory and return a list of chunk dicts
-    suitable for RAG.
-
-    Each dict has:
-      - id: e.g. "paperid::sec_1::chunk_0"
-      - text: chunk content
-      - metadata: {
-            paper_id,
-            title,
-            section,
-            section_index,
-            chunk_index
-        }
+    Extract and chunk a single TEI file. Top-level so worker processes can
+    pickle it; problem files are reported and yield no chunks.
     """
-    tei_dir_path = Path(tei_dir)
-    tei_files = sorted(list(tei_dir_path.glob("*.tei.xml")))
+    tei_path = Path(path_str)
+    try:
+        paper = extract_paper_structure_from_tei(tei_path)
+    except Exception as e:
+        print(f"[WARN] Skipping {tei_path.name} due to parse error: {e}")
+        return []
 
-    all_chunks: List[Dict] = []
+    # Quick check: any content at all? (text is already stripped and
+    # sections without paragraphs are already dropped)
+    if not paper["abstract"] and not paper["sections"]:
+        print(f"[WARN] No text found in {tei_path.name}, skipping.")
+        return []
 
-    print(f"Found {len(tei_files)} TEI files in {tei_dir_path}")
+    return build_chunks_from_paper(paper)
 
-    for tei_path in tei_files:
-        try:
-            paper = extract_paper_structure_from_tei(tei_path)
-        except Exception as e:
-            print(f"[WARN] Skipping {tei_path.name} due to parse error: {e}")
-            continue
 
-        # Quick check: any content at all?
-        has_abstract = bool(paper["abstract"].strip())
-        has_sections = any(sec["paragraphs"] for sec in paper["sections"])
+def iter_tei_dir_chunks(tei_dir: str, max_workers: Optional[int] = None) -> Iterator[Chunk]:
+    """
+    Yield the chunks of every TEI file in a directory, one paper at a
+    time, so callers can stream them without holding the whole corpus.
+    Files are parsed in parallel across max_workers processes (default:
+    one per CPU); output order follows the sorted file names either way.
+    """
+    # scandir reads the file type from the directory entry, no stat() per file;
+    # dotfiles are skipped as glob("*.tei.xml") did
+    with os.scandir(tei_dir) as it:
+        paths = [
+            e.path
+            for e in it
+            if e.name.endswith(".tei.xml") and not e.name.startswith(".") and e.is_file()
+        ]
+    paths.sort()
+
+    print(f"Found {len(paths)} TEI files in {Path(tei_dir)}")
+
+    workers = min(max_workers or os.cpu_count() or 1, len(paths))
+    if workers <= 1:
+        # Not worth a process pool
+        for paper_chunks in map(_process_one_tei, paths):
+            yield from paper_chunks
+        return
+
+    # Executor.map submits every file up front and buffers finished results
+    # until the consumer reaches them; keep only a small window in flight
+    # instead, so memory stays bounded by ~2 papers per worker
+    window = 2 * workers
+    pending = iter(paths)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=_MP_CONTEXT) as ex:
+        futures = deque(ex.submit(_process_one_tei, p) for p in islice(pending, window))
+        while futures:
+            fut = futures.popleft()
+            for path in islice(pending, 1):
+                futures.append(ex.submit(_process_one_tei, path))
+            yield from fut.result()
+
+
+def tei_dir_to_chunks(tei_dir: str, max_workers: Optional[int] = None) -> List[Chunk]:
+    """
+    Read all TEI files in a directory and return a list of Chunk records
+    suitable for RAG (see iter_tei_dir_chunks for the streaming form).
 
-        if not has_abstract and not has_sections:
-            print(f"[WARN] No text found in {tei_path.name}, skipping.")
-            continue
+    Each Chunk has:
+      - id: e.g. "paperid::sec_1::chunk_0"
+      - text: chunk content
+      - paper_id, title, section, section_index, chunk_index
+        (also available together as the .metadata dict)
+    """
+    return list(iter_tei_dir_chunks(tei_dir, max_workers=max_workers))
 
-        paper_chunks = build_chunks_from_paper(paper)
-        all_chunks.extend(paper_chunks)
 
-    return all_chunks
+def tei_dir_to_chunks_jsonl(tei_dir: str, out_path: str, max_workers: Optional[int] = None) -> int:
+    """
+    Stream the chunks of a TEI directory to a JSON Lines file, one
+    to_dict() object per line. Memory is bounded by iter_tei_dir_chunks'
+    in-flight window (about two papers per worker), not the corpus.
+    Returns the number of chunks written.
+    """
+    n = 0
+    with open(out_path, "wb") as f:
+        for chunk in iter_tei_dir_chunks(tei_dir, max_workers=max_workers):
+            f.write(orjson.dumps(chunk.to_dict()))
+            f.write(b"\n")
+            n += 1
+    return n
 
 
 # -------------------------------------------------------------------
@@ -331,10 +533,10 @@ if __name__ == "__main__":
         ch = chunks[i]
         print("\n" + "=" * 70)
         print(f"Chunk {i}")
-        print(f"ID:           {ch['id']}")
-        print(f"Paper ID:     {ch['metadata']['paper_id']}")
-        print(f"Title:        {ch['metadata']['title']}")
-        print(f"Section:      {ch['metadata']['section']}")
-        print(f"Sec index:    {ch['metadata']['section_index']}")
-        print(f"Chunk index:  {ch['metadata']['chunk_index']}")
-        print(f"Text (first 600 chars):\n{ch['text'][:600]}...")
+        print(f"ID:           {ch.id}")
+        print(f"Paper ID:     {ch.paper_id}")
+        print(f"Title:        {ch.title}")
+        print(f"Section:      {ch.section}")
+        print(f"Sec index:    {ch.section_index}")
+        print(f"Chunk index:  {ch.chunk_index}")
+        print(f"Text (first 600 chars):\n{ch.text[:600]}...")